@@ -1,9 +1,10 @@
 import streamlit as st
 import requests
-import datetime
-from PIL import Image
-import io
+import orjson
+from requests.adapters import HTTPAdapter
 import time
+import html
+import zlib
 
 # Set page config
 st.set_page_config(
@@ -20,6 +21,18 @@ DEFAULT_LOCATIONS = [
     {"name": "Kashmir", "lat": 34.0837, "lon": 74.7973}
 ]
 
+@st.cache_resource
+def get_session():
+    """Shared HTTP session so connections to open-meteo are reused across reruns"""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return session
+
+# How long fetched weather is considered fresh, in seconds
+WEATHER_TTL = 600
+
+WEATHER_URL_TMPL = "https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,wind_speed_10m,weather_code&timezone=auto"
+
 # Weather code descriptions
 WEATHER_CODES = {
     0: 'Clear sky',
@@ -48,54 +61,97 @@ WEATHER_CODES = {
     99: 'Thunderstorm with heavy hail',
 }
 
+# WMO codes are all below 100, so precompute a flat lookup table
+_WEATHER_ARR = ['Unknown'] * 100
+for _code, _desc in WEATHER_CODES.items():
+    _WEATHER_ARR[_code] = _desc
+_WEATHER_ARR = tuple(_WEATHER_ARR)
+
 def get_weather_description(code):
-    return WEATHER_CODES.get(code, 'Unknown')
+    # Open-Meteo may report a null weather_code
+    if isinstance(code, int) and 0 <= code < 100:
+        return _WEATHER_ARR[code]
+    return 'Unknown'
 
-def get_alert_status(temp, wind_speed):
-    if temp < -10 or temp > 40 or wind_speed > 20:
-        return "🔴 Critical", "red"
-    if temp < 0 or temp > 35 or wind_speed > 15:
-        return "🟡 Warning", "yellow"
-    return "🟢 Normal", "green"
+# Alert thresholds in priority order: (predicate, status, color, message)
+_ALERT_TABLE = [
+    (lambda t, w: t < -10, "🔴 Critical", "red", "Extreme cold conditions - Exercise caution"),
+    (lambda t, w: t > 40, "🔴 Critical", "red", "Extreme heat conditions - Limit exposure"),
+    (lambda t, w: w > 20, "🔴 Critical", "red", "High wind speeds - Operations may be affected"),
+    (lambda t, w: t < 0, "🟡 Warning", "yellow", "Cold conditions - Take necessary precautions"),
+    (lambda t, w: t > 35, "🟡 Warning", "yellow", "Hot conditions - Stay hydrated"),
+    (lambda t, w: w > 15, "🟡 Warning", "yellow", "Moderate wind speeds - Monitor conditions"),
+]
 
-def get_alert_message(temp, wind_speed):
-    if temp < -10:
-        return "Extreme cold conditions - Exercise caution"
-    if temp > 40:
-        return "Extreme heat conditions - Limit exposure"
-    if wind_speed > 20:
-        return "High wind speeds - Operations may be affected"
-    if temp < 0:
-        return "Cold conditions - Take necessary precautions"
-    if temp > 35:
-        return "Hot conditions - Stay hydrated"
-    if wind_speed > 15:
-        return "Moderate wind speeds - Monitor conditions"
-    return "Normal operating conditions"
+def classify(temp, wind_speed):
+    """Return (status, color, message) for the given conditions"""
+    for pred, status, color, message in _ALERT_TABLE:
+        if pred(temp, wind_speed):
+            return status, color, message
+    return "🟢 Normal", "green", "Normal operating conditions"
 
-def get_weather_image(location, weather_desc):
-    try:
-        prompt = f"{location} cityscape, {weather_desc}, professional photograph"
-        encoded_prompt = requests.utils.quote(prompt)
-        image_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=800&height=600&nologo=true"
-        return image_url
-    except Exception as e:
-        st.error(f"Error generating image URL: {str(e)}")
-        return "https://via.placeholder.com/800x600?text=Image+Not+Available"  # Fallback image
+@st.cache_data(show_spinner=False)
+def get_weather_image(location: str, weather_desc: str) -> str:
+    prompt = f"{location} cityscape, {weather_desc}, professional photograph"
+    # Stable seed so repeat prompts hit pollinations.ai's cache
+    seed = zlib.crc32(prompt.encode()) & 0xFFFFFF
+    image_url = f"https://image.pollinations.ai/prompt/{requests.utils.quote(prompt)}?width=400&height=300&nologo=true&seed={seed}"
+    return image_url
 
+@st.cache_data(ttl=WEATHER_TTL, show_spinner=False)
 def fetch_weather_data(lat, lon):
+    """Fetch current weather for a coordinate pair.
+
+    Cached for WEATHER_TTL seconds. Errors are raised rather than displayed
+    so that failures are never cached; use load_weather_data to get a
+    message instead.
+    """
+    url = WEATHER_URL_TMPL.format(lat=lat, lon=lon)
+    response = get_session().get(url, timeout=10)  # Add timeout
+    response.raise_for_status()  # Raise an exception for bad status codes
+    return orjson.loads(response.content)
+
+def weather_error_message(error):
+    """Turn a weather request exception into a user-facing message"""
+    if isinstance(error, requests.exceptions.Timeout):
+        return "Request timed out. Please try again."
+    if isinstance(error, requests.exceptions.RequestException):
+        return f"Error fetching weather data: {str(error)}"
+    return f"Error parsing weather data: {str(error)}"
+
+def load_weather_data(lat, lon):
+    """Return (weather_data, error_msg) for a coordinate pair"""
+    try:
+        return fetch_weather_data(lat, lon), None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return None, weather_error_message(e)
+
+@st.cache_data(ttl=WEATHER_TTL, show_spinner=False)
+def fetch_weather_batch(coords):
+    """Fetch current weather for several (lat, lon) pairs in one request.
+
+    Returns (weather_by_coords, fetched_at), where weather_by_coords is keyed
+    by the requested (lat, lon) pairs and fetched_at is when the API was hit.
+    Like fetch_weather_data, errors are raised so they are never cached.
+    """
+    latitudes = ','.join(str(lat) for lat, _ in coords)
+    longitudes = ','.join(str(lon) for _, lon in coords)
+    url = WEATHER_URL_TMPL.format(lat=latitudes, lon=longitudes)
+    response = get_session().get(url, timeout=10)
+    response.raise_for_status()
+    data = orjson.loads(response.content)
+    if isinstance(data, dict):  # A single location is not wrapped in a list
+        data = [data]
+    return dict(zip(coords, data)), time.time()
+
+def load_weather_batch(locations):
+    """Return (weather_by_coords, fetched_at, error_msg) for a list of location dicts"""
+    coords = tuple((loc['lat'], loc['lon']) for loc in locations)
     try:
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,wind_speed_10m,weather_code&timezone=auto"
-        response = requests.get(url, timeout=10)  # Add timeout
-        response.raise_for_status()  # Raise an exception for bad status codes
-        return response.json()
-    except requests.exceptions.Timeout:
-        st.error("Request timed out. Please try again.")
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching weather data: {str(e)}")
-    except ValueError as e:
-        st.error(f"Error parsing weather data: {str(e)}")
-    return None
+        weather_by_coords, fetched_at = fetch_weather_batch(coords)
+        return weather_by_coords, fetched_at, None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return {}, 0, weather_error_message(e)
 
 def weather_card(location_name, weather_data):
     if weather_data:
@@ -110,84 +166,71 @@ def weather_card(location_name, weather_data):
         col1, col2 = st.columns([2, 3])
         
         with col1:
-            st.image(
-                get_weather_image(location_name, weather_desc),
-                caption=location_name,
-                use_container_width=True
+            # Raw <img> lets the browser load the AI image asynchronously
+            # instead of blocking the card on Streamlit's image handling
+            image_url = html.escape(get_weather_image(location_name, weather_desc))
+            st.markdown(
+                f'<img src="{image_url}" loading="lazy" decoding="async" width="100%"/>'
+                f'<div style="text-align:center">{html.escape(location_name)}</div>',
+                unsafe_allow_html=True
             )
         
         with col2:
-            st.markdown(f"### {location_name}")
-            st.markdown(f"**Temperature:** {temp}°C")
-            st.markdown(f"**Weather:** {weather_desc}")
-            st.markdown(f"**Humidity:** {humidity}%")
-            st.markdown(f"**Wind Speed:** {wind_speed} km/h")
+            alert_status, color, alert_message = classify(temp, wind_speed)
             
-            alert_status, color = get_alert_status(temp, wind_speed)
-            st.markdown(f"**Status:** {alert_status}")
-            st.markdown(f"_{get_alert_message(temp, wind_speed)}_")
+            # One markdown element per card instead of one per line
+            st.markdown(
+                f"### {location_name}\n\n"
+                f"**Temperature:** {temp}°C  \n"
+                f"**Weather:** {weather_desc}  \n"
+                f"**Humidity:** {humidity}%  \n"
+                f"**Wind Speed:** {wind_speed} km/h  \n"
+                f"**Status:** {alert_status}\n\n"
+                f"_{alert_message}_"
+            )
 
+@st.cache_data(persist="disk", max_entries=1000, show_spinner=False)
 def get_location_suggestions(query):
-    """Get location suggestions based on user input"""
-    try:
-        if len(query) < 2:  # Only search if user has typed at least 2 characters
-            return []
-            
-        response = requests.get(
-            f"https://geocoding-api.open-meteo.com/v1/search?name={query}&count=5&language=en&format=json"
-        )
-        response.raise_for_status()
-        data = response.json()
-        
-        if not data.get('results'):
-            return []
-            
-        # Format suggestions with country and admin area
-        suggestions = []
-        for result in data['results']:
-            location_parts = [result['name']]
-            if result.get('admin1'):  # State/Province
-                location_parts.append(result['admin1'])
-            if result.get('country'):  # Country
-                location_parts.append(result['country'])
-            
-            suggestion = {
-                'name': ', '.join(location_parts),
-                'lat': result['latitude'],
-                'lon': result['longitude']
-            }
-            suggestions.append(suggestion)
-            
-        return suggestions
-    except Exception as e:
-        st.error(f"Error fetching suggestions: {str(e)}")
+    """Get location suggestions based on user input (raises on request errors)"""
+    if len(query) < 2:  # Only search if user has typed at least 2 characters
         return []
-
-def main():
-    # Header
-    st.title("🎖️ Military Weather Monitoring System")
+        
+    response = get_session().get(
+        "https://geocoding-api.open-meteo.com/v1/search",
+        params={"name": query, "count": 5, "language": "en", "format": "json"},
+        timeout=10
+    )
+    response.raise_for_status()
+    data = orjson.loads(response.content)
     
-    # Search box with suggestions
-    st.markdown("""
-        <style>
-        .search-container { margin-bottom: 1rem; }
-        .suggestion-item {
-            padding: 8px 16px;
-            cursor: pointer;
-            border-bottom: 1px solid #eee;
-        }
-        .suggestion-item:hover {
-            background-color: #f0f2f6;
+    if not data.get('results'):
+        return []
+        
+    # Format suggestions with country and admin area
+    suggestions = []
+    for result in data['results']:
+        location_parts = [result['name']]
+        if result.get('admin1'):  # State/Province
+            location_parts.append(result['admin1'])
+        if result.get('country'):  # Country
+            location_parts.append(result['country'])
+        
+        suggestion = {
+            'name': ', '.join(location_parts),
+            'lat': result['latitude'],
+            'lon': result['longitude']
         }
-        </style>
-    """, unsafe_allow_html=True)
-    
-    # Initialize session state for search
-    if 'search_query' not in st.session_state:
-        st.session_state.search_query = ''
-    if 'selected_location' not in st.session_state:
-        st.session_state.selected_location = None
-    
+        suggestions.append(suggestion)
+        
+    return suggestions
+
+@st.fragment
+def search_panel():
+    """Search box, suggestions and searched-location weather.
+
+    Runs as a fragment so interacting with it does not rerun the
+    Strategic Locations section.
+    """
     # Search input
     search_col, button_col = st.columns([4, 1])
     with search_col:
@@ -201,8 +244,18 @@ def main():
         search_button = st.button('🔍 Search')
     
     # Show suggestions while typing
-    if search_query and len(search_query) >= 2:
-        suggestions = get_location_suggestions(search_query)
+    suggestions = []
+    lookup_failed = False
+    # Normalized so case/whitespace variants share one disk-cache entry
+    lookup_query = search_query.strip().lower()
+    if len(lookup_query) >= 2:
+        # st.text_input only submits on Enter or blur, so there is no keystroke
+        # stream to debounce; repeat queries are served by st.cache_data
+        try:
+            suggestions = get_location_suggestions(lookup_query)
+        except Exception as e:
+            st.error(f"Error fetching suggestions: {str(e)}")
+            lookup_failed = True
         if suggestions:
             st.markdown("### Suggestions:")
             for suggestion in suggestions:
@@ -214,73 +267,110 @@ def main():
                     st.session_state.selected_location = suggestion
                     st.session_state.search_query = suggestion['name']
                     
+    # Resolve the location to show exactly once per run
+    target = st.session_state.selected_location
+    if target is None and search_button:
+        if len(lookup_query) < 2:
+            # The geocoding API returns nothing for fewer than 2 characters
+            st.warning("Please enter at least 2 characters to search.")
+            return
+        if lookup_failed:
+            # The lookup error has already been shown above
+            return
+        if not suggestions:
+            st.warning(f"No results found for '{search_query}'. Please try a different location.")
+            return
+        target = suggestions[0]
+    
     # Handle search
-    if search_button or st.session_state.selected_location:
+    if target:
+        # Reset selected location after displaying
+        st.session_state.selected_location = None
         try:
             with st.spinner('Fetching weather data...'):
-                if st.session_state.selected_location:
-                    # Use the selected location's coordinates
-                    location = st.session_state.selected_location
-                    weather_data = fetch_weather_data(location['lat'], location['lon'])
-                    
-                    if weather_data:
-                        st.success(f"Found weather data for {location['name']}")
-                        st.subheader(f"Weather in {location['name']}")
-                        weather_card(location['name'], weather_data)
-                    else:
-                        st.error("Unable to fetch weather data for this location")
-                    
-                    # Reset selected location after displaying
-                    st.session_state.selected_location = None
+                weather_data, error_msg = load_weather_data(target['lat'], target['lon'])
+                
+                if weather_data:
+                    st.success(f"Found weather data for {target['name']}")
+                    st.subheader(f"Weather in {target['name']}")
+                    weather_card(target['name'], weather_data)
                 else:
-                    # Original search functionality
-                    geo_response = requests.get(
-                        f"https://geocoding-api.open-meteo.com/v1/search?name={search_query}&count=1&language=en&format=json"
-                    )
-                    
-                    if not geo_response.ok:
-                        st.error(f"Error accessing geocoding service: {geo_response.status_code}")
-                        return
-                    
-                    geo_data = geo_response.json()
-                    
-                    if not geo_data.get('results'):
-                        st.warning(f"No results found for '{search_query}'. Please try a different location.")
-                        return
-                    
-                    location = geo_data['results'][0]
-                    weather_data = fetch_weather_data(location['latitude'], location['longitude'])
-                    
-                    if weather_data:
-                        st.success(f"Found weather data for {location['name']}")
-                        st.subheader(f"Weather in {location['name']}")
-                        weather_card(location['name'], weather_data)
-                    else:
-                        st.error("Unable to fetch weather data for this location")
+                    st.error(error_msg or "Unable to fetch weather data for this location")
                 
-        except requests.exceptions.RequestException as e:
-            st.error(f"Network error: {str(e)}")
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
-    
-    # Strategic Locations
+
+def refresh_strategic_weather():
+    """Mark strategic weather stale; runs before the fragment rerun it triggers"""
+    fetch_weather_batch.clear()
+    st.session_state.strategic_ts = 0
+
+@st.fragment
+def strategic_panel():
+    """Weather cards for DEFAULT_LOCATIONS, refreshed independently of search"""
     st.markdown("---")  # Add a divider
     st.subheader("Strategic Locations")
     
     # Create two columns for the strategic locations
     col1, col2 = st.columns(2)
     
+    # Only refetch on first load, once the data is stale, or after a refresh
+    if ('strategic_weather' not in st.session_state
+            or st.session_state.get('strategic_ts', 0) + WEATHER_TTL < time.time()):
+        # Fetch all default locations in a single batched request
+        weather_by_coords, fetched_at, error_msg = load_weather_batch(DEFAULT_LOCATIONS)
+        if error_msg:
+            st.error(error_msg)
+            # Keep showing the last good data; strategic_ts is left stale so
+            # the next rerun retries
+            weather_by_coords = st.session_state.get('strategic_weather', {})
+        else:
+            st.session_state.strategic_weather = weather_by_coords
+            # Age is measured from the API fetch, not from this cache read
+            st.session_state.strategic_ts = fetched_at
+    else:
+        weather_by_coords = st.session_state.strategic_weather
+    
     # Display weather cards for default locations
     for idx, location in enumerate(DEFAULT_LOCATIONS):
         with col1 if idx % 2 == 0 else col2:
-            weather_data = fetch_weather_data(location['lat'], location['lon'])
+            weather_data = weather_by_coords.get((location['lat'], location['lon']))
             if weather_data:
                 with st.expander(f"📍 {location['name']}", expanded=True):
                     weather_card(location['name'], weather_data)
     
     # Add a refresh button instead of automatic refresh
-    if st.button('🔄 Refresh Data'):
-        st.experimental_rerun()
+    st.button('🔄 Refresh Data', on_click=refresh_strategic_weather)
+
+def main():
+    # Header
+    st.title("🎖️ Military Weather Monitoring System")
+    
+    # Search box with suggestions
+    st.markdown("""
+        <style>
+        .search-container { margin-bottom: 1rem; }
+        .suggestion-item {
+            padding: 8px 16px;
+            cursor: pointer;
+            border-bottom: 1px solid #eee;
+        }
+        .suggestion-item:hover {
+            background-color: #f0f2f6;
+        }
+        </style>
+    """, unsafe_allow_html=True)
+    
+    # Initialize session state for search
+    if 'search_query' not in st.session_state:
+        st.session_state.search_query = ''
+    if 'selected_location' not in st.session_state:
+        st.session_state.selected_location = None
+    
+    search_panel()
+    
+    # Strategic Locations
+    strategic_panel()
 
 if __name__ == "__main__":
     main() 